@@ -1,4 +1,6 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import gzip
 import argparse
 from datetime import datetime
@@ -11,8 +13,20 @@ import time
 
 def read_cur_file(file_path):
     print(f"Reading CUR file: {file_path}")
-    with gzip.open(file_path, 'rt') as f:
-        df = pd.read_csv(f, low_memory=False)
+    try:
+        # PyArrow CSV reader; gzip is detected from the file extension.
+        # Files are already processed one per worker in the multiprocessing pool, so the
+        # reader runs single-threaded instead of starting cpu_count() threads per worker.
+        # Empty strings are read as nulls to match pandas.
+        read_options = pacsv.ReadOptions(use_threads=False)
+        convert_options = pacsv.ConvertOptions(strings_can_be_null=True)
+        df = pacsv.read_csv(file_path, read_options=read_options, convert_options=convert_options).to_pandas(
+            split_blocks=True, self_destruct=True, use_threads=False)
+    except pa.ArrowInvalid:
+        # read_csv promotes column types across blocks, so this only fires on rows PyArrow
+        # cannot parse, e.g. rows with fewer fields than the header (pandas fills them with NaN)
+        with gzip.open(file_path, 'rt') as f:
+            df = pd.read_csv(f, low_memory=False)
     print("Columns in file:", df.columns.tolist())  # <-- Debug print
     return df
 
@@ -103,7 +117,7 @@ def analyze_ri_savings(df, ri_id_set=None):
         print(f"Warning: The public on-demand cost column '{public_ondemand_cost_col}' is all zeros. Please check if this is correct.")
 
     # Convert usage start date to datetime with UTC timezone
-    df[usage_start_date_col] = pd.to_datetime(df[usage_start_date_col])
+    df[usage_start_date_col] = pd.to_datetime(df[usage_start_date_col], utc=True, format='ISO8601', cache=True)
 
     # Filter for May 2025 (using UTC timezone)
     may_start = pd.Timestamp('2025-06-01', tz=UTC)
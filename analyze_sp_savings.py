@@ -1,4 +1,6 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import gzip
 import argparse
 from datetime import datetime
@@ -27,9 +29,21 @@ def read_savings_plan_ids(file_path='sp-id'):
 def read_cur_file(file_path):
     """Read and parse the CUR gzip file."""
     print(f"Reading CUR file: {file_path}")
-    with gzip.open(file_path, 'rt') as f:
-        # Read with low_memory=False to avoid dtype warnings
-        df = pd.read_csv(f, low_memory=False)
+    try:
+        # PyArrow CSV reader; gzip is detected from the file extension.
+        # Files are already processed one per worker in the multiprocessing pool, so the
+        # reader runs single-threaded instead of starting cpu_count() threads per worker.
+        # Empty strings are read as nulls to match pandas.
+        read_options = pacsv.ReadOptions(use_threads=False)
+        convert_options = pacsv.ConvertOptions(strings_can_be_null=True)
+        df = pacsv.read_csv(file_path, read_options=read_options, convert_options=convert_options).to_pandas(
+            split_blocks=True, self_destruct=True, use_threads=False)
+    except pa.ArrowInvalid:
+        # read_csv promotes column types across blocks, so this only fires on rows PyArrow
+        # cannot parse, e.g. rows with fewer fields than the header (pandas fills them with NaN)
+        with gzip.open(file_path, 'rt') as f:
+            # Read with low_memory=False to avoid dtype warnings
+            df = pd.read_csv(f, low_memory=False)
 
     # Print column names for debugging
     print("\nAvailable columns in the CUR file:")
@@ -144,7 +158,7 @@ def analyze_savings_plans(df, savings_plan_ids):
         raise ValueError(f"Missing required columns: {', '.join(missing_cols)}")
 
     # Convert usage start date to datetime with UTC timezone
-    df[usage_start_date_col] = pd.to_datetime(df[usage_start_date_col])
+    df[usage_start_date_col] = pd.to_datetime(df[usage_start_date_col], utc=True, format='ISO8601', cache=True)
 
     # Filter for April 2025 (using UTC timezone)
     april_start = pd.Timestamp('2025-06-01', tz=UTC)
@@ -61,7 +61,10 @@ bucket = s3.Bucket(bucket_name)
 objs_to_delete = list(bucket.objects.filter(Prefix=prefix))
 if objs_to_delete:
     print(f"[INFO] Deleting {len(objs_to_delete)} objects under {prefix}")
-    bucket.delete_objects(Delete={'Objects': [{'Key': obj.key} for obj in objs_to_delete]})
+    # DeleteObjects 单次请求最多 1000 个 key，分批删除
+    for i in range(0, len(objs_to_delete), 1000):
+        batch = objs_to_delete[i:i + 1000]
+        bucket.delete_objects(Delete={'Objects': [{'Key': obj.key} for obj in batch], 'Quiet': True})
 else:
     print(f"[INFO] No existing data to delete under {prefix}")
 
@@ -4,50 +4,91 @@ CUR数据文件字段字节占用统计脚本
 支持Parquet格式的AWS CUR数据文件分析
 """
 
-import pandas as pd
+import numpy as np
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
+from pyarrow import fs
 import os
 import sys
 from pathlib import Path
 import argparse
+from collections import Counter
 
 def get_column_memory_usage(df):
-    """计算DataFrame中每列的内存使用量"""
-    memory_usage = {}
+    """计算DataFrame中每列的内存使用量，返回列名列表和对应的字节数数组"""
+    # 一次性获取所有列的内存使用量（字节）
+    memory_usage = df.memory_usage(deep=True, index=False)
     
-    for col in df.columns:
-        # 获取列的内存使用量（字节）
-        col_memory = df[col].memory_usage(deep=True)
-        memory_usage[col] = col_memory
-    
-    return memory_usage
+    return list(memory_usage.index), memory_usage.to_numpy(dtype=np.int64)
+
+# 远程文件读取时的缓冲区大小，配合pre_buffer合并多个列块的读取请求
+READ_BUFFER_SIZE = 8 * 1024 * 1024
+
+def resolve_file_path(file_path):
+    """解析文件路径，返回 (文件系统, 路径)，支持本地路径和 s3:// 等远程路径"""
+    if '://' in file_path:
+        return fs.FileSystem.from_uri(file_path)
+    return fs.LocalFileSystem(), os.path.abspath(file_path)
 
-def analyze_parquet_metadata(file_path):
-    """分析Parquet文件的元数据以获取列信息"""
+def open_parquet_file(filesystem, path):
+    """打开Parquet文件，预先缓冲并合并列块读取，远程文件可并发获取"""
+    source = filesystem.open_input_file(path)
+    return pq.ParquetFile(source, pre_buffer=True, buffer_size=READ_BUFFER_SIZE)
+
+def analyze_parquet_metadata(file_path, sample_only=True):
+    """分析Parquet文件的元数据以获取列信息
+    sample_only为True且有多个row group时，列大小只取第一个row group并按行数比例估算整个文件，
+    空值数始终累加所有row group的统计信息（只读取页脚，开销很小）
+    """
     try:
-        parquet_file = pq.ParquetFile(file_path)
+        parquet_file = open_parquet_file(*resolve_file_path(file_path))
         metadata = parquet_file.metadata
         schema = parquet_file.schema
+        arrow_schema = parquet_file.schema_arrow
+        
+        # 各列的压缩/原始大小累加到数组中，按列索引对齐
+        compressed = np.zeros(metadata.num_columns, dtype=np.int64)
+        uncompressed = np.zeros(metadata.num_columns, dtype=np.int64)
+        # 空值数直接取自页脚中的列统计信息，缺少统计信息的列单独标记
+        null_counts = np.zeros(metadata.num_columns, dtype=np.int64)
+        has_null_count = np.ones(metadata.num_columns, dtype=bool)
         
-        column_info = {}
+        # 同一文件内各row group的列大小通常很接近，抽样第一个即可
+        first_rows = metadata.row_group(0).num_rows if metadata.num_row_groups > 0 else 0
+        estimated = sample_only and metadata.num_row_groups > 1 and first_rows > 0
         
         # 获取每个列组的统计信息
         for row_group_idx in range(metadata.num_row_groups):
             row_group = metadata.row_group(row_group_idx)
+            # 估算模式下只累加第一个row group的列大小，空值数不做估算
+            count_size = not estimated or row_group_idx == 0
             
             for col_idx in range(row_group.num_columns):
                 col_meta = row_group.column(col_idx)
-                col_name = schema.names[col_idx]
+                if count_size:
+                    compressed[col_idx] += col_meta.total_compressed_size
+                    uncompressed[col_idx] += col_meta.total_uncompressed_size
                 
-                if col_name not in column_info:
-                    column_info[col_name] = {
-                        'total_compressed_size': 0,
-                        'total_uncompressed_size': 0,
-                        'data_type': str(schema.field(col_idx).type)
-                    }
-                
-                column_info[col_name]['total_compressed_size'] += col_meta.total_compressed_size
-                column_info[col_name]['total_uncompressed_size'] += col_meta.total_uncompressed_size
+                statistics = col_meta.statistics
+                if statistics is not None and statistics.has_null_count:
+                    null_counts[col_idx] += statistics.null_count
+                else:
+                    has_null_count[col_idx] = False
+        
+        if estimated:
+            scale = metadata.num_rows / first_rows
+            compressed = np.rint(compressed * scale).astype(np.int64)
+            uncompressed = np.rint(uncompressed * scale).astype(np.int64)
+        
+        column_info = {
+            'names': schema.names,
+            'data_types': [str(arrow_schema.field(name).type) for name in schema.names],
+            'total_compressed_size': compressed,
+            'total_uncompressed_size': uncompressed,
+            'null_count': null_counts,
+            'has_null_count': has_null_count,
+            'estimated': estimated
+        }
         
         return column_info, metadata.num_rows
     
@@ -55,58 +96,130 @@ def analyze_parquet_metadata(file_path):
         print(f"无法读取Parquet元数据: {e}")
         return None, 0
 
+def get_null_counts(file_path, column_info):
+    """获取每列的空值数量
+    优先使用元数据中的统计信息，缺少统计信息的列才读取数据进行计算
+    """
+    null_counts = column_info['null_count'].copy()
+    missing = np.flatnonzero(~column_info['has_null_count'])
+    
+    if len(missing) > 0:
+        names = [column_info['names'][idx] for idx in missing]
+        table = open_parquet_file(*resolve_file_path(file_path)).read(columns=names)
+        for idx, name in zip(missing, names):
+            null_counts[idx] = pc.sum(pc.is_null(table.column(name))).as_py() or 0
+    
+    return null_counts
+
+BYTE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
 def format_bytes(bytes_value):
     """格式化字节数为可读格式"""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if bytes_value < 1024.0:
-            return f"{bytes_value:.2f} {unit}"
-        bytes_value /= 1024.0
-    return f"{bytes_value:.2f} TB"
+    # 每1024为一级，直接由二进制位数确定单位，最大到TB
+    exponent = min(max(int(bytes_value).bit_length() - 1, 0) // 10, len(BYTE_UNITS) - 1)
+    return f"{bytes_value / (1 << (10 * exponent)):.2f} {BYTE_UNITS[exponent]}"
 
-def analyze_cur_file(file_path, sample_rows=None):
+def print_lines(lines):
+    """将多行内容拼接后一次性输出，减少逐行print的开销"""
+    text = '\n'.join(lines)
+    if text:
+        sys.stdout.write(text + '\n')
+
+def analyze_memory_usage(parquet_file, sample_rows=None):
+    """读取数据并分析各列的内存使用量，返回读取的DataFrame"""
+    # 读取样本数据进行内存使用量分析
+    print("=== 内存使用量分析 ===")
+    if sample_rows:
+        print(f"读取前 {sample_rows} 行进行分析...")
+        batch = next(parquet_file.iter_batches(batch_size=sample_rows), None)
+        df = batch.to_pandas() if batch is not None else parquet_file.schema_arrow.empty_table().to_pandas()
+    else:
+        print("读取完整文件进行分析...")
+        df = parquet_file.read().to_pandas()
+    
+    print(f"数据形状: {df.shape[0]:,} 行 × {df.shape[1]} 列")
+    print()
+    
+    # 获取内存使用量
+    column_names, memory_usage = get_column_memory_usage(df)
+    
+    # 按内存使用量降序排序
+    order = np.argsort(-memory_usage, kind='stable')
+    
+    total_memory = int(memory_usage.sum())
+    
+    print(f"{'字段名':<30} {'内存使用':<15} {'占比':<10} {'数据类型':<20}")
+    print("-" * 80)
+    
+    lines = []
+    for idx in order:
+        col_name = column_names[idx]
+        memory_bytes = int(memory_usage[idx])
+        percentage = (memory_bytes / total_memory) * 100
+        dtype = str(df[col_name].dtype)
+        lines.append(f"{col_name:<30} {format_bytes(memory_bytes):<15} "
+                     f"{percentage:.1f}%{'':<5} {dtype:<20}")
+    print_lines(lines)
+    
+    print("-" * 80)
+    print(f"{'总计':<30} {format_bytes(total_memory):<15} {'100.0%':<10}")
+    print()
+    
+    return df
+
+def analyze_cur_file(file_path, sample_rows=None, exact=False, memory=True):
     """分析CUR文件的字段字节占用"""
     
     print(f"正在分析文件: {file_path}")
     print("=" * 60)
     
     # 检查文件是否存在
-    if not os.path.exists(file_path):
+    filesystem, path = resolve_file_path(file_path)
+    file_info = filesystem.get_file_info(path)
+    if file_info.type == fs.FileType.NotFound:
         print(f"错误: 文件 {file_path} 不存在")
         return
     
-    file_size = os.path.getsize(file_path)
+    file_size = file_info.size
     print(f"文件大小: {format_bytes(file_size)}")
     print()
     
     try:
         # 首先分析Parquet元数据
-        column_metadata, total_rows = analyze_parquet_metadata(file_path)
+        column_metadata, total_rows = analyze_parquet_metadata(file_path, sample_only=not exact)
         
         if column_metadata:
             print("=== Parquet文件列压缩信息 ===")
             print(f"总行数: {total_rows:,}")
+            if column_metadata['estimated']:
+                print("(根据第一个row group按行数比例估算，使用 --exact 统计所有row group)")
             print()
             
-            # 按压缩大小排序
-            sorted_columns = sorted(column_metadata.items(), 
-                                  key=lambda x: x[1]['total_compressed_size'], 
-                                  reverse=True)
+            compressed = column_metadata['total_compressed_size']
+            uncompressed = column_metadata['total_uncompressed_size']
             
-            total_compressed = sum(info['total_compressed_size'] for _, info in sorted_columns)
-            total_uncompressed = sum(info['total_uncompressed_size'] for _, info in sorted_columns)
+            # 按压缩大小降序排序
+            order = np.argsort(-compressed, kind='stable')
+            
+            total_compressed = int(compressed.sum())
+            total_uncompressed = int(uncompressed.sum())
             
             print(f"{'字段名':<30} {'数据类型':<20} {'压缩大小':<15} {'原始大小':<15} {'压缩比':<10}")
             print("-" * 100)
             
-            for col_name, info in sorted_columns:
-                compressed_size = info['total_compressed_size']
-                uncompressed_size = info['total_uncompressed_size']
+            # 每个部分的逐列输出先拼接，再一次性输出
+            lines = []
+            for idx in order:
+                col_name = column_metadata['names'][idx]
+                compressed_size = int(compressed[idx])
+                uncompressed_size = int(uncompressed[idx])
                 compression_ratio = uncompressed_size / compressed_size if compressed_size > 0 else 0
                 
-                print(f"{col_name:<30} {info['data_type']:<20} "
-                      f"{format_bytes(compressed_size):<15} "
-                      f"{format_bytes(uncompressed_size):<15} "
-                      f"{compression_ratio:.2f}x")
+                lines.append(f"{col_name:<30} {column_metadata['data_types'][idx]:<20} "
+                             f"{format_bytes(compressed_size):<15} "
+                             f"{format_bytes(uncompressed_size):<15} "
+                             f"{compression_ratio:.2f}x")
+            print_lines(lines)
             
             print("-" * 100)
             print(f"{'总计':<30} {'':<20} "
@@ -115,51 +228,34 @@ def analyze_cur_file(file_path, sample_rows=None):
                   f"{total_uncompressed/total_compressed:.2f}x")
             print()
         
-        # 读取样本数据进行内存使用量分析
-        print("=== 内存使用量分析 ===")
-        if sample_rows:
-            print(f"读取前 {sample_rows} 行进行分析...")
-            df = pd.read_parquet(file_path, nrows=sample_rows)
-        else:
-            print("读取完整文件进行分析...")
-            df = pd.read_parquet(file_path)
+        parquet_file = open_parquet_file(filesystem, path)
         
-        print(f"数据形状: {df.shape[0]:,} 行 × {df.shape[1]} 列")
-        print()
-        
-        # 获取内存使用量
-        memory_usage = get_column_memory_usage(df)
-        
-        # 按内存使用量排序
-        sorted_memory = sorted(memory_usage.items(), key=lambda x: x[1], reverse=True)
-        
-        total_memory = sum(memory_usage.values())
-        
-        print(f"{'字段名':<30} {'内存使用':<15} {'占比':<10} {'数据类型':<20}")
-        print("-" * 80)
-        
-        for col_name, memory_bytes in sorted_memory:
-            percentage = (memory_bytes / total_memory) * 100
-            dtype = str(df[col_name].dtype)
-            print(f"{col_name:<30} {format_bytes(memory_bytes):<15} "
-                  f"{percentage:.1f}%{'':<5} {dtype:<20}")
-        
-        print("-" * 80)
-        print(f"{'总计':<30} {format_bytes(total_memory):<15} {'100.0%':<10}")
-        print()
+        # 读取样本数据进行内存使用量分析
+        df = analyze_memory_usage(parquet_file, sample_rows) if memory else None
         
-        # 显示一些基本统计信息
+        # 显示一些基本统计信息，只需要Schema，不读取数据
         print("=== 数据类型统计 ===")
-        dtype_counts = df.dtypes.value_counts()
-        for dtype, count in dtype_counts.items():
-            print(f"{str(dtype):<20}: {count} 列")
+        type_counts = Counter(str(field.type) for field in parquet_file.schema_arrow)
+        print_lines(f"{dtype:<20}: {count} 列" for dtype, count in type_counts.most_common())
         
         # 显示空值统计
         print("\n=== 空值统计 (前10个字段) ===")
-        null_counts = df.isnull().sum().sort_values(ascending=False).head(10)
-        for col, null_count in null_counts.items():
-            null_percentage = (null_count / len(df)) * 100
-            print(f"{col:<30}: {null_count:,} ({null_percentage:.1f}%)")
+        if column_metadata:
+            null_counts = get_null_counts(file_path, column_metadata)
+            lines = []
+            for idx in np.argsort(-null_counts, kind='stable')[:10]:
+                col = column_metadata['names'][idx]
+                null_count = int(null_counts[idx])
+                null_percentage = (null_count / total_rows) * 100 if total_rows else 0
+                lines.append(f"{col:<30}: {null_count:,} ({null_percentage:.1f}%)")
+            print_lines(lines)
+        elif df is not None:
+            null_counts = df.isnull().sum().sort_values(ascending=False).head(10)
+            lines = []
+            for col, null_count in null_counts.items():
+                null_percentage = (null_count / len(df)) * 100
+                lines.append(f"{col:<30}: {null_count:,} ({null_percentage:.1f}%)")
+            print_lines(lines)
             
     except Exception as e:
         print(f"读取文件时出错: {e}")
@@ -170,10 +266,14 @@ def main():
     parser.add_argument('file_path', help='CUR数据文件路径')
     parser.add_argument('--sample', type=int, 
                        help='仅分析指定行数的样本数据（用于大文件）')
+    parser.add_argument('--exact', action='store_true',
+                       help='统计所有row group的元数据，而不是根据第一个row group估算')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                       help='跳过内存使用量分析，不读取数据')
     
     args = parser.parse_args()
     
-    analyze_cur_file(args.file_path, args.sample)
+    analyze_cur_file(args.file_path, args.sample, args.exact, args.memory)
 
 if __name__ == "__main__":
     # 如果直接运行且没有命令行参数，提供交互式输入
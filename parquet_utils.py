@@ -6,27 +6,50 @@ Parquet转换工具模块
 提供CSV/gzip到Parquet格式的转换功能
 """
 
+import contextlib
 import io
-import json
+import itertools
 import logging
-import tempfile
 import os
-from typing import Dict, List, Optional, Set, Union
+import re
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Union
 
+import numpy as np
+import orjson
+from isal import igzip
 import pandas as pd
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 import pyarrow.parquet as pq
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# CSV读取器的字段值转换错误，例如 "In CSV column #5: CSV conversion error to double: invalid value '1yr'"
+_CSV_CONVERSION_ERROR_PATTERN = re.compile(r'In CSV column #(\d+): (?:Row #\d+: )?CSV conversion error')
+
+# pandas 3.0起Copy-on-Write默认开启且该选项已弃用，只有旧版本需要显式开启
+_NEEDS_COPY_ON_WRITE_OPTION = int(pd.__version__.split('.')[0]) < 3
+
+def _copy_on_write():
+    """在当前代码块内开启Copy-on-Write，避免列赋值时的防御性拷贝
+    只在转换过程中临时开启，不修改调用方的全局pandas设置
+    
+    Returns:
+        上下文管理器
+    """
+    if _NEEDS_COPY_ON_WRITE_OPTION:
+        return pd.option_context('mode.copy_on_write', True)
+    return contextlib.nullcontext()
+
 class ParquetConverter:
     """处理文件格式转换
     使用简单直接的方法处理CSV到Parquet的转换
     特别关注时间字段和Map字段的正确处理
     """
     # 定义需要强制为字符串类型的字段
-    STRING_COLUMNS = {
+    STRING_COLUMNS = frozenset({
         'line_item_usage_account_id',
         'bill_payer_account_id',
         'line_item_resource_id',
@@ -41,31 +64,116 @@ class ParquetConverter:
         'pricing_plan_arn',
         'resource_id',
         'bill_invoice_id'  # 确保账单ID是字符串类型
-    }
+    })
+    
+    # 低基数字符串字段，使用字典编码以减少内存占用
+    LOW_CARDINALITY_COLUMNS = frozenset({
+        'line_item_operation',
+        'line_item_line_item_type',
+        'product_product_family',
+        'line_item_usage_type',
+        'pricing_term',
+        'product_region'
+    })
     
-    # 时间字段列表
-    TIME_FIELDS = [
+    # 时间字段集合
+    TIME_FIELDS = frozenset({
         'line_item_usage_start_date',
         'line_item_usage_end_date',
         'bill_billing_period_start_date',
         'bill_billing_period_end_date'
-    ]
+    })
     
-    # Map字段列表
-    MAP_FIELDS = [
+    # Map字段集合
+    MAP_FIELDS = frozenset({
         'cost_category',
         'discount',
         'product',
         'resource_tags'
-    ]
+    })
+    
+    # 表定义（cur.schema）中声明为double的字段，直接按double读取，不依赖第一个数据块的类型推断：
+    # 没有预留实例/Savings Plans的账户中，reservation_*/savings_plan_*等字段可能整列为空
+    DOUBLE_COLUMNS = frozenset({
+        'discount_bundled_discount',
+        'discount_total_discount',
+        'line_item_blended_cost',
+        'line_item_net_unblended_cost',
+        'line_item_normalization_factor',
+        'line_item_normalized_usage_amount',
+        'line_item_unblended_cost',
+        'line_item_usage_amount',
+        'pricing_public_on_demand_cost',
+        'reservation_amortized_upfront_cost_for_usage',
+        'reservation_amortized_upfront_fee_for_billing_period',
+        'reservation_effective_cost',
+        'reservation_net_amortized_upfront_cost_for_usage',
+        'reservation_net_amortized_upfront_fee_for_billing_period',
+        'reservation_net_effective_cost',
+        'reservation_net_recurring_fee_for_usage',
+        'reservation_net_unused_amortized_upfront_fee_for_billing_period',
+        'reservation_net_unused_recurring_fee',
+        'reservation_net_upfront_value',
+        'reservation_recurring_fee_for_usage',
+        'reservation_unused_amortized_upfront_fee_for_billing_period',
+        'reservation_unused_normalized_unit_quantity',
+        'reservation_unused_quantity',
+        'reservation_unused_recurring_fee',
+        'reservation_upfront_value',
+        'savings_plan_amortized_upfront_commitment_for_billing_period',
+        'savings_plan_net_amortized_upfront_commitment_for_billing_period',
+        'savings_plan_net_recurring_commitment_for_billing_period',
+        'savings_plan_net_savings_plan_effective_cost',
+        'savings_plan_recurring_commitment_for_billing_period',
+        'savings_plan_savings_plan_effective_cost',
+        'savings_plan_savings_plan_rate',
+        'savings_plan_total_commitment_to_date',
+        'savings_plan_used_commitment',
+        'split_line_item_actual_usage',
+        'split_line_item_net_split_cost',
+        'split_line_item_net_unused_cost',
+        'split_line_item_public_on_demand_split_cost',
+        'split_line_item_public_on_demand_unused_cost',
+        'split_line_item_reserved_usage',
+        'split_line_item_split_cost',
+        'split_line_item_split_usage',
+        'split_line_item_split_usage_ratio',
+        'split_line_item_unused_cost'
+    })
+    
+    # 已知字段的Parquet类型：时间字段为timestamp('ms')（匹配表定义中的timestamp(3)），
+    # Map字段和字符串字段为字符串
+    SCHEMA_ROUTING = {
+        **{col: pa.string() for col in STRING_COLUMNS | MAP_FIELDS},
+        **{col: pa.timestamp('ms') for col in TIME_FIELDS},
+    }
+    
+    # 默认row group行数，较小的row group便于Athena按统计信息跳过数据；
+    # 字段数超过WIDE_SCHEMA_COLUMNS时使用更小的row group，控制每个字段的页大小
+    ROW_GROUP_SIZE = 512 * 1024
+    WIDE_ROW_GROUP_SIZE = 128 * 1024
+    WIDE_SCHEMA_COLUMNS = 200
+    
+    # 流式读取CSV时每个数据块的大小（字节）
+    CSV_BLOCK_SIZE = 32 * 1024 * 1024
     
-    def __init__(self, memory_threshold_mb: int = 200):
+    def __init__(self, memory_threshold_mb: int = 200,
+                 compression: str = 'zstd', compression_level: Optional[int] = 3,
+                 row_group_size: Optional[int] = None, data_page_size: int = 1 << 20):
         """初始化转换器
         
         Args:
             memory_threshold_mb: 内存处理阈值（MB），小于此值的文件直接在内存中处理
+            compression: Parquet压缩算法，对写入延迟敏感时可使用'lz4'
+            compression_level: 压缩级别，snappy等不支持压缩级别的算法需传None
+            row_group_size: 每个row group的最大行数，为None时按字段数自动选择
+            data_page_size: 数据页大小（字节）
         """
         self.memory_threshold = memory_threshold_mb * 1024 * 1024  # 转换为字节
+        self.compression = compression
+        self.compression_level = compression_level
+        self.row_group_size = row_group_size
+        self.data_page_size = data_page_size
     
     def convert_csv_to_parquet(self, csv_content: bytes) -> Optional[bytes]:
         """将CSV内容转换为Parquet格式
@@ -77,81 +185,290 @@ class ParquetConverter:
             Parquet格式的字节内容，失败时返回None
         """
         try:
-            # 使用临时文件处理
-            with tempfile.NamedTemporaryFile(suffix='.csv.gz', delete=False) as csv_tmp:
-                csv_path = csv_tmp.name
-                csv_tmp.write(csv_content)
-                csv_tmp.flush()
+            # 全程在内存中处理：用isal的igzip边读边解压（比标准库zlib快约30%），
+            # 不保留完整的解压后内容，Parquet写入内存缓冲区，不再经过临时文件
+            open_stream = self._gzip_opener(io.BytesIO(csv_content))
+            sink = self._convert(open_stream, pa.BufferOutputStream(), pa.BufferOutputStream)
+            
+            return sink.getvalue().to_pybytes()
+        
+        except Exception as e:
+            logger.error(f"CSV转Parquet失败: {str(e)}")
+            return None
+    
+    def convert_csv_to_parquet_stream(self, source: BinaryIO, sink: Union[str, BinaryIO]) -> bool:
+        """以流式方式将gzip压缩的CSV文件转换为Parquet
+        适用于超过内存处理阈值的大文件，边解压边转换，不在内存中保留完整的CSV或Parquet内容
+        
+        Args:
+            source: gzip压缩的CSV文件对象，必须支持seek（类型探测后需要从头重新读取）
+            sink: Parquet输出的文件路径或可写文件对象，文件对象需支持seek和truncate
+                  （类型推断失败重新转换时需要清空已写入的内容）
             
-            # 创建临时输出文件
-            with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as parquet_tmp:
-                parquet_path = parquet_tmp.name
+        Returns:
+            转换成功返回True，失败返回False
+        """
+        def reset_sink():
+            if not isinstance(sink, str):
+                sink.seek(0)
+                sink.truncate()
+            return sink
+        
+        try:
+            self._convert(self._gzip_opener(source), sink, reset_sink)
+            return True
+        
+        except Exception as e:
+            logger.error(f"CSV转Parquet失败: {str(e)}")
+            return False
+    
+    @staticmethod
+    def _gzip_opener(source: BinaryIO) -> Callable[[], igzip.IGzipFile]:
+        """生成从头读取gzip压缩CSV的函数
+        
+        Args:
+            source: gzip压缩的CSV文件对象，必须支持seek
             
+        Returns:
+            每次调用都回到文件开头并返回新的解压流的函数
+        """
+        def open_stream():
+            source.seek(0)
+            return igzip.IGzipFile(fileobj=source, mode='rb')
+        
+        return open_stream
+    
+    def _convert(self, open_stream: Callable[[], object], sink: Union[str, BinaryIO, pa.NativeFile],
+                 reset_sink: Callable[[], Union[str, BinaryIO, pa.NativeFile]]) -> Union[str, BinaryIO, pa.NativeFile]:
+        """读取CSV并写入Parquet，字段值无法转换为double时将该字段按字符串重新转换
+        
+        数值字段的类型在读取前固定，后续数据块中出现非数值内容时CSV读取器会报错，
+        此时只把出错的字段改为按字符串读取，从头重新转换（与pandas只把该列读为object一致）
+        
+        Args:
+            open_stream: 返回解压后CSV内容的函数，每次调用都从头读取
+            sink: Parquet输出位置
+            reset_sink: 重新转换前调用，返回清空后的Parquet输出位置
+            
+        Returns:
+            最终写入的Parquet输出位置
+        """
+        string_columns = set()
+        while True:
             try:
-                # 读取CSV为DataFrame
-                df = pd.read_csv(csv_path, compression='gzip', low_memory=False)
-                
-                # 处理数据类型
-                df = self._process_data_types(df)
-                
-                # 创建Parquet Schema，明确指定时间字段为timestamp类型
-                fields = []
-                for col in df.columns:
-                    if col in self.TIME_FIELDS:
-                        # 时间字段使用timestamp类型，指定为毫秒精度(timestamp(3))
-                        fields.append(pa.field(col, pa.timestamp('ms')))
-                        logger.info(f"将字段 {col} 设置为timestamp('ms')类型，匹配表定义中的timestamp(3)")
-                    elif col in self.MAP_FIELDS:
-                        # Map字段使用字符串类型
-                        fields.append(pa.field(col, pa.string()))
-                        logger.debug(f"将字段 {col} 设置为字符串类型")
-                    elif col in self.STRING_COLUMNS:
-                        # 字符串字段
-                        fields.append(pa.field(col, pa.string()))
-                    elif pd.api.types.is_float_dtype(df[col].dtype):
-                        # 浮点数字段
-                        fields.append(pa.field(col, pa.float64()))
-                    elif pd.api.types.is_integer_dtype(df[col].dtype):
-                        # 整数字段
-                        fields.append(pa.field(col, pa.int64()))
-                    else:
-                        # 其他字段默认为字符串
-                        fields.append(pa.field(col, pa.string()))
-                
-                schema = pa.schema(fields)
-                
-                # 使用PyArrow写入Parquet文件，加入更多配置以提高兼容性
-                table = pa.Table.from_pandas(df, schema=schema)
-                
-                # 写入配置
-                write_options = {
-                    'compression': 'snappy',                # 使用snappy压缩，这是标准的Parquet压缩方式
-                    'version': '2.0',                      # 使用Parquet 2.0格式，提高兼容性
-                    'write_statistics': True,              # 写入统计信息，有助于查询优化
-                    'coerce_timestamps': 'ms',             # 强制时间戳为毫秒精度，匹配表定义中的timestamp(3)
-                }
-                
-                pq.write_table(table, parquet_path, **write_options)
-                logger.info(f"使用PyArrow写入Parquet文件，指定时间字段为timestamp('ms')类型，匹配表定义中的timestamp(3)")
-                
-                # 读取生成的Parquet文件
-                with open(parquet_path, 'rb') as f:
-                    parquet_content = f.read()
+                self._write_parquet(open_stream, sink, string_columns)
+                return sink
+            except pa.ArrowInvalid as e:
+                # 只处理字段值转换错误，空文件、列数不一致等其他错误直接抛出
+                match = _CSV_CONVERSION_ERROR_PATTERN.match(str(e))
+                if match is None:
+                    raise
+                column_index = int(match.group(1))
+                message = str(e)
+            
+            # 在except块之外重新转换，失败的读取器已随异常一起释放
+            column = self._read_csv_header(open_stream)[column_index]
+            if column in string_columns:
+                raise pa.ArrowInvalid(message)
+            logger.warning("字段 %s 中存在无法转换为double的值，改为按字符串读取后重新转换: %s", column, message)
+            string_columns.add(column)
+            sink = reset_sink()
+    
+    @staticmethod
+    def _read_csv_header(open_stream: Callable[[], object]) -> List[str]:
+        """读取CSV的字段名
+        
+        Args:
+            open_stream: 返回解压后CSV内容的函数，每次调用都从头读取
+            
+        Returns:
+            按CSV中顺序排列的字段名
+        """
+        with open_stream() as stream:
+            header = stream.readline()
+        return pacsv.read_csv(pa.py_buffer(header)).column_names
+    
+    def _write_parquet(self, open_stream: Callable[[], object], sink: Union[str, BinaryIO, pa.NativeFile],
+                       string_columns: Set[str] = frozenset()) -> None:
+        """读取CSV并写入Parquet
+        
+        Args:
+            open_stream: 返回解压后CSV内容的函数，类型探测和正式读取各调用一次
+            sink: Parquet输出位置
+            string_columns: 存在非数值内容、需要按字符串读取的字段
+        """
+        # 写入配置
+        write_options = {
+            'compression': self.compression,               # 默认zstd，压缩率明显优于snappy，CPU开销相近
+            'compression_level': self.compression_level,   # zstd级别3兼顾压缩率和写入速度
+            'version': '2.6',                              # 使用Parquet 2.6格式（新版PyArrow已不支持'2.0'）
+            'coerce_timestamps': 'ms',                     # 强制时间戳为毫秒精度，匹配表定义中的timestamp(3)
+            'data_page_size': self.data_page_size,         # 数据页大小，默认1MB
+        }
+        
+        # 按数据块流式读取CSV，处理后的数据块累积到row_group_size行再写入一个row group，
+        # 使row group大小不受CSV数据块大小限制；内存峰值与row group大小相关，而与文件大小无关
+        # 读取器在with中打开，转换出错时立即关闭，不会在重新转换时与新的读取器同时读取源文件
+        with self._open_csv_reader(open_stream, string_columns) as reader:
+            tables = self._iter_tables(reader)
+            first_table = next(tables)
+            row_group_size = self._get_row_group_size(first_table.schema)
+            write_options.update(self._get_column_write_options(first_table.schema))
+            with pq.ParquetWriter(sink, first_table.schema, **write_options) as writer:
+                pending = []
+                pending_rows = 0
+                written = False
+                for table in itertools.chain([first_table], tables):
+                    pending.append(table)
+                    pending_rows += table.num_rows
+                    if pending_rows >= row_group_size:
+                        # 只写入完整的row group，剩余的行留到下一次与后续数据块合并
+                        buffered = pa.concat_tables(pending)
+                        full_rows = pending_rows - pending_rows % row_group_size
+                        writer.write_table(buffered.slice(0, full_rows), row_group_size=row_group_size)
+                        pending = [buffered.slice(full_rows)]
+                        pending_rows -= full_rows
+                        written = True
                 
-                return parquet_content
+                # 写入剩余的行；没有数据行时也写入空表，保持与之前相同的文件结构
+                if pending_rows or not written:
+                    writer.write_table(pa.concat_tables(pending), row_group_size=row_group_size)
+        logger.info("使用PyArrow写入Parquet文件，指定时间字段为timestamp('ms')类型，匹配表定义中的timestamp(3)")
+    
+    def _get_row_group_size(self, schema: pa.Schema) -> int:
+        """确定每个row group的最大行数
+        
+        Args:
+            schema: 写入的Arrow Schema
             
-            finally:
-                # 清理临时文件
-                for path in [csv_path, parquet_path]:
-                    if os.path.exists(path):
-                        try:
-                            os.unlink(path)
-                        except Exception as e:
-                            logger.warning(f"清理临时文件失败: {path}, 错误: {str(e)}")
+        Returns:
+            row group行数，未指定时宽表使用较小的值
+        """
+        if self.row_group_size is not None:
+            return self.row_group_size
+        if len(schema) > self.WIDE_SCHEMA_COLUMNS:
+            return self.WIDE_ROW_GROUP_SIZE
+        return self.ROW_GROUP_SIZE
+    
+    def _get_column_write_options(self, schema: pa.Schema) -> Dict:
+        """按字段设置字典编码和统计信息
         
-        except Exception as e:
-            logger.error(f"CSV转Parquet失败: {str(e)}")
-            return None
+        Map字段是高基数的JSON字符串，字典编码基本无效，因此关闭字典编码，使用默认的PLAIN编码
+        （DELTA_BYTE_ARRAY需要Spark 3.3+的向量化读取器，Glue 3.0及更早版本无法读取）；
+        所有字段都写入统计信息：空值数供par_analyzer-size.py直接从页脚读取，
+        超长的Map值不会写入最小/最大值，不会明显增大页脚
+        
+        Args:
+            schema: 写入的Arrow Schema
+            
+        Returns:
+            ParquetWriter的字段级写入参数
+        """
+        other_columns = [name for name in schema.names if name not in self.MAP_FIELDS]
+        
+        return {
+            'use_dictionary': other_columns,      # Map字段不使用字典编码
+            'write_statistics': True,             # 写入统计信息，有助于查询优化
+        }
+    
+    def _open_csv_reader(self, open_stream: Callable[[], object],
+                         string_columns: Set[str] = frozenset()) -> pacsv.CSVStreamingReader:
+        """打开CSV的流式读取器
+        
+        流式读取器只根据第一个数据块推断字段类型，后续数据块类型不一致时会报错，
+        因此先读取第一个数据块确定字段，再固定字段类型重新打开：
+        已知的字符串/Map/时间字段直接按字符串读取，表定义中的double字段按double读取，
+        其余字段中推断为数值或整列为空的统一为double（与表定义一致），非数值字段按字符串读取，交由后续步骤处理
+        
+        Args:
+            open_stream: 返回解压后CSV内容（可读、可关闭的文件对象）的函数，每次调用都从头读取
+            string_columns: 按字符串读取的字段，用于后续数据块中出现非数值内容的字段
+            
+        Returns:
+            CSV流式读取器
+        """
+        read_options = pacsv.ReadOptions(block_size=self.CSV_BLOCK_SIZE, use_threads=True)
+        
+        # 已知字段直接按字符串解析，不参与类型推断：
+        # 字符串字段和Map字段保持原样，时间字段交由_process_data_types统一解析
+        known_columns = self.STRING_COLUMNS | self.MAP_FIELDS | self.TIME_FIELDS
+        known_types = {col: pa.string() for col in known_columns}
+        
+        # 类型探测只需要第一个数据块：在当前线程中读出并关闭探测用的流之后，才打开正式读取的流，
+        # 避免两个读取器同时读取同一个源文件对象（多线程读取器关闭后仍可能在后台预读）
+        # 多读一个字节，使第一个数据块不被当作最后一块，末尾不完整的一行不会参与解析
+        with open_stream() as stream:
+            head = stream.read(self.CSV_BLOCK_SIZE + 1)
+        
+        probe_read_options = pacsv.ReadOptions(block_size=self.CSV_BLOCK_SIZE, use_threads=False)
+        with pacsv.open_csv(pa.py_buffer(head),
+                            read_options=probe_read_options,
+                            convert_options=pacsv.ConvertOptions(column_types=known_types)) as probe:
+            inferred_schema = probe.schema
+        del head
+        
+        column_types = {}
+        for field in inferred_schema:
+            if field.name in known_types:
+                column_types[field.name] = known_types[field.name]
+            elif field.name in string_columns:
+                column_types[field.name] = pa.string()
+            elif (field.name in self.DOUBLE_COLUMNS or pa.types.is_null(field.type)
+                  or pa.types.is_integer(field.type) or pa.types.is_floating(field.type)):
+                column_types[field.name] = pa.float64()
+            else:
+                column_types[field.name] = pa.string()
+        
+        convert_options = pacsv.ConvertOptions(column_types=column_types,
+                                               strings_can_be_null=True)
+        return pacsv.open_csv(open_stream(),
+                              read_options=read_options,
+                              convert_options=convert_options)
+    
+    def _iter_tables(self, reader: pacsv.CSVStreamingReader) -> Iterator[pa.Table]:
+        """逐个数据块处理数据类型并转换为Arrow Table
+        
+        Args:
+            reader: CSV流式读取器
+            
+        Yields:
+            处理后的Arrow Table，CSV没有数据行时返回一个空表
+        """
+        schema = self._build_schema(reader.schema)
+        has_rows = False
+        for batch in reader:
+            has_rows = True
+            # 只在处理数据块时开启Copy-on-Write，yield之前退出，不影响调用方
+            with _copy_on_write():
+                # split_blocks/self_destruct：每列单独成块，并在转换过程中释放Arrow缓冲区
+                df = self._process_data_types(batch.to_pandas(split_blocks=True, self_destruct=True))
+                # 多线程转换各字段；字段类型在CSV解析时已固定，无需再做溢出/截断检查
+                table = pa.Table.from_pandas(df, schema=schema, preserve_index=False,
+                                             nthreads=os.cpu_count(), safe=False)
+            yield self._normalize_string_columns(table)
+        
+        if not has_rows:
+            yield self._normalize_string_columns(schema.empty_table())
+    
+    def _build_schema(self, csv_schema: pa.Schema) -> pa.Schema:
+        """创建Parquet Schema，明确指定时间字段为timestamp类型
+        直接根据CSV读取器的Arrow Schema生成，不需要检查pandas的dtype
+        
+        Args:
+            csv_schema: CSV读取器的Schema
+            
+        Returns:
+            PyArrow Schema
+        """
+        # 已知字段直接查表，其余字段沿用CSV解析时固定的类型（double或string）
+        fields = [pa.field(field.name, self.SCHEMA_ROUTING.get(field.name, field.type))
+                  for field in csv_schema]
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("将时间字段 %s 设置为timestamp('ms')类型，匹配表定义中的timestamp(3)",
+                        sorted(self.TIME_FIELDS.intersection(csv_schema.names)))
+        
+        return pa.schema(fields)
     
     def _process_data_types(self, df: pd.DataFrame) -> pd.DataFrame:
         """处理DataFrame的数据类型
@@ -162,114 +479,184 @@ class ParquetConverter:
         Returns:
             处理后的DataFrame
         """
-        # 强制将特定字段转换为字符串类型
-        for col in self.STRING_COLUMNS:
-            if col in df.columns:
-                df[col] = df[col].fillna('').astype(str)
-                logger.debug(f"将字段 {col} 转换为字符串类型")
-        
         # 处理时间字段 - 确保它们在Parquet文件中被正确存储为timestamp类型
-        for col in self.TIME_FIELDS:
-            if col in df.columns:
-                try:
-                    # 转换为datetime类型
-                    df[col] = pd.to_datetime(df[col])
-                    # 移除时区信息
-                    if df[col].dt.tz is not None:
-                        df[col] = df[col].dt.tz_localize(None)
-                    
-                    # 将datetime转换为标准格式的字符串，这样可以确保它们被正确解析
-                    # 使用ISO 8601格式，这是最标准的时间格式
-                    df[col] = df[col].dt.strftime('%Y-%m-%dT%H:%M:%S.%f').str[:-3]
-                    logger.info(f"将字段 {col} 转换为ISO 8601格式的字符串: {df[col].iloc[0] if not df[col].empty else ''}")
-                except Exception as e:
-                    logger.error(f"转换时间字段失败 {col}: {str(e)}")
+        # 与DataFrame字段取交集只计算一次，避免逐个字段查找pandas Index
+        for col in self.TIME_FIELDS.intersection(df.columns):
+            try:
+                # 转换为datetime类型，显式指定ISO 8601格式以跳过逐行格式推断，
+                # cache=True对重复的时间值只解析一次
+                values = pd.to_datetime(df[col], format='ISO8601', cache=True, errors='coerce')
+                # 移除时区信息
+                if values.dt.tz is not None:
+                    values = values.dt.tz_localize(None)
+                
+                # 直接转换为毫秒精度，由PyArrow按timestamp('ms')写入，无需先格式化为字符串
+                # 中间结果使用局部变量，最后只对DataFrame赋值一次
+                df[col] = values.astype('datetime64[ms]')
+                # 日志级别未启用时不读取示例值
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("将字段 %s 转换为毫秒精度的时间类型: %s", col, df[col].iloc[0] if len(df) else '')
+            except Exception as e:
+                logger.error(f"转换时间字段失败 {col}: {str(e)}")
         
         # 处理Map字段 - 保持JSON格式，但确保与Hive表的schema定义兼容
-        for field in self.MAP_FIELDS:
-            if field in df.columns:
-                try:
-                    # 先将空值替换为空字典字符串
-                    df[field] = df[field].fillna('{}')
-                    
-                    # 确保每个值都是有效的JSON字符串，但不使用结构体
-                    def ensure_valid_json_map(val):
-                        if pd.isna(val) or val == '':
-                            return '{}'
-                        
-                        # 如果已经是字典对象，转换为JSON字符串
-                        if isinstance(val, dict):
-                            # 对discount字段进行特殊处理，确保值是数值类型
-                            if field == 'discount':
-                                try:
-                                    # 尝试将值转换为浮点数
-                                    return json.dumps({str(k): float(v) for k, v in val.items()})
-                                except (ValueError, TypeError):
-                                    # 如果转换失败，保持原样
-                                    return json.dumps({str(k): str(v) for k, v in val.items()})
-                            else:
-                                # 其他Map字段，确保所有键和值都是字符串
-                                return json.dumps({str(k): str(v) for k, v in val.items()})
-                        
-                        # 如果是字符串，尝试解析为JSON
-                        if isinstance(val, str):
-                            try:
-                                # 如果是JSON字符串，解析并重新格式化
-                                if val.strip() and val.strip()[0] == '{':
-                                    parsed = json.loads(val)
-                                    # 对discount字段进行特殊处理
-                                    if field == 'discount':
-                                        try:
-                                            # 尝试将值转换为浮点数
-                                            return json.dumps({str(k): float(v) for k, v in parsed.items()})
-                                        except (ValueError, TypeError):
-                                            # 如果转换失败，保持原样
-                                            return json.dumps({str(k): str(v) for k, v in parsed.items()})
-                                    else:
-                                        # 其他Map字段，确保所有键和值都是字符串
-                                        return json.dumps({str(k): str(v) for k, v in parsed.items()})
-                                else:
-                                    # 如果不是JSON对象，直接返回原始字符串
-                                    return val
-                            except:
-                                # 解析失败，返回原始字符串
-                                return val
-                        
-                        # 其他类型，转换为字符串
-                        return str(val)
-                    
-                    # 应用到每一行
-                    df[field] = df[field].apply(ensure_valid_json_map)
-                    
-                    logger.debug(f"将字段 {field} 转换为JSON字符串: {df[field].iloc[0] if not df[field].empty else '{}'}")
-                    
-                except Exception as e:
-                    logger.error(f"转换Map字段失败 {field}: {str(e)}")
-                    # 如果转换失败，将其设置为空字典字符串
-                    df[field] = df[field].apply(lambda x: '{}' if pd.isna(x) or x == '' else str(x))
+        for field in self.MAP_FIELDS.intersection(df.columns):
+            try:
+                # 确保每个值都是有效的JSON字符串，但不使用结构体
+                # 空值和空字典写为null，不占用Map的键空间
+                df[field] = normalize_map_series(df[field], field)
+                
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("将字段 %s 转换为JSON字符串: %s", field, df[field].iloc[0] if len(df) else None)
+                
+            except Exception as e:
+                logger.error(f"转换Map字段失败 {field}: {str(e)}")
+                # 如果转换失败，空值设置为null，其余转换为字符串
+                df[field] = df[field].apply(lambda x: None if pd.isna(x) or x == '' else str(x))
         
         return df
+    
+    def _normalize_string_columns(self, table: pa.Table) -> pa.Table:
+        """将特定字段转换为字符串类型，并将空值替换为空字符串
+        使用Arrow compute完成，避免逐个单元格创建Python字符串对象
+        低基数字段同时进行字典编码
+        
+        Args:
+            table: 输入的Arrow Table
+            
+        Returns:
+            处理后的Arrow Table
+        """
+        for col in self.STRING_COLUMNS.intersection(table.column_names):
+            idx = table.schema.get_field_index(col)
+            column = table.column(idx)
+            # CSV解析时已固定为字符串类型，已经是字符串且没有空值时无需再转换
+            if column.type != pa.string():
+                column = pc.cast(column, pa.string())
+            if column.null_count:
+                column = pc.fill_null(column, '')
+            if col in self.LOW_CARDINALITY_COLUMNS:
+                column = pc.dictionary_encode(column)
+            table = table.set_column(idx, col, column)
+            logger.debug("将字段 %s 转换为字符串类型", col)
+        
+        return table
+
+# 已经规范化的字符串Map：紧凑格式、键和值都是不含转义的字符串，与重新序列化的结果一致
+_NORMALIZED_STRING_MAP_PATTERN = r'\{"[^"\\]*":"[^"\\]*"(?:,"[^"\\]*":"[^"\\]*")*\}'
+
+# 判断数据源是否输出规范格式时抽样的值个数
+_MAP_SAMPLE_SIZE = 128
 
-def parse_json_or_default(value):
-    """解析JSON字符串，如果失败则返回默认值
+def _dump_string_map(val: dict) -> str:
+    """将字典序列化为JSON字符串，所有键和值都转换为字符串
     
     Args:
-        value: 要解析的JSON字符串
-                
+        val: 非空字典
+        
     Returns:
-        解析后的字典，或者默认值
+        JSON字符串
     """
-    if pd.isna(value) or value == '':
-        return {'_empty': ''}
+    return orjson.dumps({str(k): str(v) for k, v in val.items()}).decode()
+
+def _dump_discount_map(val: dict) -> str:
+    """将discount字段的字典序列化为JSON字符串，确保值是数值类型
+    
+    Args:
+        val: 非空字典
         
+    Returns:
+        JSON字符串，值无法转换为浮点数时保持为字符串
+    """
     try:
-        # 如果已经是字典类型，直接返回
-        if isinstance(value, dict):
-            return value if value else {'_empty': ''}
-                
-        # 尝试解析JSON字符串
-        result = json.loads(value)
-        return result if result else {'_empty': ''}
-    except Exception:
-        # 解析失败，返回包含原始值的字典
-        return {'value': str(value)}
+        # 尝试将值转换为浮点数
+        return orjson.dumps({str(k): float(v) for k, v in val.items()}).decode()
+    except (ValueError, TypeError):
+        # 如果转换失败，保持原样
+        return _dump_string_map(val)
+
+def make_map_transform(field: str) -> Callable[[object], Optional[str]]:
+    """为指定的Map字段生成逐值规范化函数
+    字段相关的分支在生成时确定一次，逐行处理时不再比较字段名
+    
+    Args:
+        field: 字段名，discount字段的值会转换为数值
+        
+    Returns:
+        将单个值规范化为JSON字符串的函数，空值或空字典返回None（在Parquet中存储为null）
+    """
+    dump_map = _dump_discount_map if field == 'discount' else _dump_string_map
+    
+    def transform(val) -> Optional[str]:
+        if pd.isna(val) or val == '':
+            return None
+        
+        # 如果已经是字典对象，转换为JSON字符串
+        if isinstance(val, dict):
+            return dump_map(val) if val else None
+        
+        # 如果是字符串，尝试解析为JSON
+        if isinstance(val, str):
+            # 如果不是JSON对象，直接返回原始字符串，不进入异常处理
+            if val.lstrip()[:1] != '{':
+                return val
+            # 如果是JSON字符串，解析并重新格式化
+            try:
+                parsed = orjson.loads(val)
+            except orjson.JSONDecodeError:
+                # 解析失败，返回原始字符串
+                return val
+            return dump_map(parsed) if parsed else None
+        
+        # 其他类型，转换为字符串
+        return str(val)
+    
+    return transform
+
+def normalize_map_array(values: np.ndarray, field: str) -> List[Optional[str]]:
+    """逐个规范化Map字段的值
+    直接遍历底层的对象数组，避免Series.apply逐行分派的开销
+    
+    Args:
+        values: 字段值组成的对象数组
+        field: 字段名
+        
+    Returns:
+        规范化后的字符串列表，空值为None
+    """
+    transform = make_map_transform(field)
+    return [transform(val) for val in values]
+
+def normalize_map_series(values: pd.Series, field: str) -> pd.Series:
+    """规范化整列Map字段的值
+    字符串列先用向量化的掩码筛选出JSON对象，只对这部分逐行解析，
+    其余值（空值、非JSON字符串）直接处理，不经过Python逐行调用
+    
+    Args:
+        values: 字段值
+        field: 字段名
+        
+    Returns:
+        规范化后的字段值，空值为None
+    """
+    if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+        # 包含字典等非字符串值时逐行处理
+        return pd.Series(normalize_map_array(values.to_numpy(dtype=object), field),
+                         index=values.index, dtype=object)
+    
+    needs_parse = values.str.match(r'\s*\{', na=False).to_numpy(dtype=bool, copy=True)
+    if field != 'discount' and needs_parse.any():
+        # 已经是规范格式的值保持原样，跳过解析和重新序列化（discount字段的值需要转换为数值）
+        # 先抽样检查，抽样中没有规范格式的值时（数据源不输出紧凑格式）跳过整列的正则匹配
+        candidates = values[needs_parse]
+        if candidates.head(_MAP_SAMPLE_SIZE).str.fullmatch(_NORMALIZED_STRING_MAP_PATTERN).any():
+            needs_parse[needs_parse] = ~candidates.str.fullmatch(_NORMALIZED_STRING_MAP_PATTERN).to_numpy(dtype=bool)
+    is_empty = (values.isna() | (values == '')).to_numpy(dtype=bool)
+    
+    result = values.to_numpy(dtype=object, copy=True)
+    result[is_empty] = None
+    # 整列都已规范化时不再进入逐行处理
+    if needs_parse.any():
+        result[needs_parse] = normalize_map_array(result[needs_parse], field)
+    
+    return pd.Series(result, index=values.index, dtype=object)